@@ -1,20 +1,27 @@
 import json
+import os
 import sys
+import multiprocessing
 from pathlib import Path
 import numpy as np
+import torch
 from paddleocr import PaddleOCR
 import re
 from transformers import AutoTokenizer, AutoModelForTokenClassification
 from transformers import pipeline
 
-def convert_float32(obj):
-    if isinstance(obj, np.float32):
-        return float(obj)
-    elif isinstance(obj, list):
-        return [convert_float32(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: convert_float32(v) for k, v in obj.items()}
-    return obj
+# ONNX Runtime is optional (`pip install optimum[onnxruntime]`), eager PyTorch is the fallback
+try:
+    from optimum.onnxruntime import ORTModelForTokenClassification
+except ImportError:
+    ORTModelForTokenClassification = None
+
+# Lets json serialize numpy scalars (eg. NER scores) as they're encountered,
+# instead of walking the whole result beforehand to convert them
+def json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
 
 def get_input_filepath(filename):
     input_path = Path(filename)
@@ -26,25 +33,40 @@ def get_input_filepath(filename):
 
     return input_path
 
-def check_paddle_output_exists(input_path):
-    output_dir = Path("paddle_output") / input_path.stem
-    return output_dir.exists()
-
+# Returns None when there is no saved OCR output for this file
 def get_paddle_output_from_file(input_path):
     output_dir = Path("paddle_output") / input_path.stem
     json_file = output_dir / (input_path.stem + "_0_res.json")
-    with json_file.open("r", encoding="utf-8") as f:
-        ocr_results = json.load(f)
+    try:
+        with json_file.open("r", encoding="utf-8") as f:
+            ocr_results = json.load(f)
+    except FileNotFoundError:
+        return None
     return ocr_results
 
-def run_paddle_ocr(input_path):
-    # Initialize PaddleOCR
-    ocr = PaddleOCR(
+# The PaddleOCR instance for this process. Loading its models costs far more than
+# running them on a single image, so it's loaded once and reused for every file
+_OCR = None
+
+def init_ocr(cpu_threads=None):
+    global _OCR
+    # MKL-DNN kernels for det/rec on CPU, using every core unless told otherwise
+    _OCR = PaddleOCR(
         use_doc_orientation_classify=False,
         use_doc_unwarping=False,
-        use_textline_orientation=False
+        use_textline_orientation=False,
+        enable_mkldnn=True,
+        cpu_threads=cpu_threads or os.cpu_count()
     )
 
+def get_ocr():
+    if _OCR is None:
+        init_ocr()
+    return _OCR
+
+def run_paddle_ocr(input_path):
+    ocr = get_ocr()
+
     # Run OCR
     print(f"Running OCR on {input_path} ...")
     results = ocr.predict(str(input_path))
@@ -58,58 +80,147 @@ def run_paddle_ocr(input_path):
     
     return results[0]._to_json()['res'] # TODO: implement for multiple pages
 
+# Runs OCR over many files with a pool of worker processes, each of which loads
+# the models once (in its initializer) and then handles its share of the files.
+# The cores are split between the workers so they don't oversubscribe the CPU
+def run_paddle_ocr_batch(input_paths, processes=None):
+    processes = processes or os.cpu_count()
+    cpu_threads = max(1, os.cpu_count() // processes)
+
+    with multiprocessing.Pool(processes=processes, initializer=init_ocr, initargs=(cpu_threads,)) as pool:
+        return pool.map(run_paddle_ocr, input_paths)
+
+CAPS_PATTERN = re.compile(r"[A-Z]+")
+
+def title_case_caps(match):
+    return match.group(0).title()
+
 def preprocess_for_ner(ocr_results):
     texts, scores = ocr_results["rec_texts"], ocr_results["rec_scores"]
 
-    # convert caps to title case and filter by score
-    regex_converter = lambda text: re.sub('[A-Z]+', lambda x: x.group(0).title(), text)
+    # convert caps to title case and filter by score in a single pass.
+    # str.title() on the whole line would also lowercase mixed case words
+    # (eg. McDonald), so only the all caps runs are converted
     threshold = 0.9
-    texts = [regex_converter(texts[i]) for i in range(len(texts)) if scores[i] >= threshold]
+    texts = [CAPS_PATTERN.sub(title_case_caps, t) for t, s in zip(texts, scores) if s >= threshold]
+
+    # one sequence per OCR line so the pipeline can batch them
+    return texts
+
+# bf16 is only faster than fp32 on CPUs that support it natively (AVX512-BF16 or AMX),
+# elsewhere it's emulated and slower
+def cpu_supports_bf16():
+    if not torch.backends.mkldnn.is_available():
+        return False
+
+    try:
+        cpuinfo = Path("/proc/cpuinfo").read_text()
+    except OSError:
+        return False
+
+    return "avx512_bf16" in cpuinfo or "amx_bf16" in cpuinfo
 
-    return ' '.join(texts)
+NER_MODEL = "dslim/bert-large-NER"
+# Token classification holds up fine at half precision, which halves weight bandwidth,
+# as long as the hardware runs it natively. Otherwise it stays at full precision
+NER_DEVICE_TYPE = "cuda" if torch.cuda.is_available() else "cpu"
+if NER_DEVICE_TYPE == "cuda":
+    NER_DTYPE = torch.float16
+elif cpu_supports_bf16():
+    NER_DTYPE = torch.bfloat16
+else:
+    NER_DTYPE = torch.float32
+ONNX_MODEL_DIR = Path("onnx_model") / NER_MODEL.replace("/", "_")
+_NER_PIPELINE = None
+
+# Exports the model to ONNX on first use and loads the cached export afterwards
+def load_onnx_ner_model():
+    provider = "CUDAExecutionProvider" if NER_DEVICE_TYPE == "cuda" else "CPUExecutionProvider"
+
+    if ONNX_MODEL_DIR.exists():
+        return ORTModelForTokenClassification.from_pretrained(ONNX_MODEL_DIR, provider=provider)
+
+    model = ORTModelForTokenClassification.from_pretrained(NER_MODEL, export=True, provider=provider)
+    model.save_pretrained(ONNX_MODEL_DIR)
+    return model
+
+# Loading the model dwarfs running it, so the pipeline is built once per process
+def get_ner_pipeline():
+    global _NER_PIPELINE
+
+    if _NER_PIPELINE is None:
+        tokenizer = AutoTokenizer.from_pretrained(NER_MODEL)
+
+        if ORTModelForTokenClassification is not None:
+            # The execution provider already places the model on its device
+            model = load_onnx_ner_model()
+            device_kwargs = {}
+        else:
+            model = AutoModelForTokenClassification.from_pretrained(
+                NER_MODEL,
+                torch_dtype=NER_DTYPE
+            )
+            model.eval()
+            device_kwargs = {"device": 0 if NER_DEVICE_TYPE == "cuda" else -1}
+
+        _NER_PIPELINE = pipeline(
+            "ner",
+            model=model,
+            tokenizer=tokenizer,
+            aggregation_strategy="simple",
+            batch_size=16,
+            **device_kwargs
+        )
+
+    return _NER_PIPELINE
 
 def run_ner(texts):
-    model = "dslim/bert-large-NER"
+    nlp = get_ner_pipeline()
+
+    # autocast only applies to the eager PyTorch model (ONNX Runtime doesn't run
+    # through torch), and only when it's at reduced precision
+    use_autocast = ORTModelForTokenClassification is None and NER_DTYPE != torch.float32
 
-    tokenizer = AutoTokenizer.from_pretrained(model)
-    model = AutoModelForTokenClassification.from_pretrained(model)
+    # a list of sequences yields a list of entity lists, one per sequence
+    with torch.inference_mode(), torch.autocast(NER_DEVICE_TYPE, dtype=NER_DTYPE, enabled=use_autocast):
+        results = [entity for entities in nlp(texts) for entity in entities]
 
-    nlp = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+    return results
 
-    results = nlp(texts)
-    return convert_float32(results)
+# Entity groups kept from the NER output, mapped to the prefix of their ids
+NER_GROUP_PREFIXES = {"ORG": "org", "PER": "person" , "LOC": "addr"}
+NER_CONFIDENCE_THRESHOLD = 0.75
 
-def post_process_ner(ner_input, ner_results):
-    # Filter out unwanted entity groups:
-    prefixes = {"ORG": "org", "PER": "person" , "LOC": "addr"}
-    ner_results = [item for item in ner_results if item["entity_group"] in prefixes]
+# Final keys of each entity group in the output
+NER_GROUP_KEYS = {"ORG": "organizations", "PER": "persons", "LOC": "addresses"}
 
-    # Filter out low confidence results
-    confidence_threshold = 0.75
-    ner_results = [item for item in ner_results if item["score"] >= confidence_threshold]
+def post_process_ner(ner_input, ner_results):
+    prefixes = NER_GROUP_PREFIXES
+    confidence_threshold = NER_CONFIDENCE_THRESHOLD
 
-    # reorganize into sets by entity group to get rid of duplicates
-    results = {}
+    # Filter out unwanted entity groups and low confidence results, keeping
+    # the highest scoring entity per (group, word) to get rid of duplicates
+    best = {}
     for item in ner_results:
         group = item["entity_group"]
-        if group not in results:
-            results[group] = {}
-
-        if item["word"] not in results[group]:
-            results[group][item["word"]] = {
-                "id": prefixes[group] + '_' + item["word"].replace(" ", "_").lower(),
-                "label": item["word"],
-                "score": item["score"],
-                "source": "ner"
-            }
-        else:
-            # keep the highest score
-            results[group][item["word"]]["score"] = max(results[group][item["word"]]["score"], item["score"])
+        score = item["score"]
+        if group not in prefixes or score < confidence_threshold:
+            continue
 
-    # Rename keys
-    results["organizations"] = results.pop("ORG", {})
-    results["persons"] = results.pop("PER", {})
-    results["addresses"] = results.pop("LOC", {})
+        key = (group, item["word"])
+        current = best.get(key)
+        if current is None or score > current["score"]:
+            best[key] = item
+
+    # Group into the final shape, with every group present even if empty
+    results = {k: {} for k in NER_GROUP_KEYS.values()}
+    for (group, word), item in best.items():
+        results[NER_GROUP_KEYS[group]][word] = {
+            "id": prefixes[group] + '_' + word.replace(" ", "_").lower(),
+            "label": word,
+            "score": item["score"],
+            "source": "ner"
+        }
 
     return results
 
@@ -122,9 +233,9 @@ def main():
 
     input_path = get_input_filepath(filename)
     
-    if check_paddle_output_exists(input_path):
-        ocr_results = get_paddle_output_from_file(input_path)
-    else:
+    ocr_results = get_paddle_output_from_file(input_path)
+
+    if ocr_results is None:
         print("Paddle OCR output not found for this file. END LOOP")
         sys.exit(1) # don't bother
         ocr_results = run_paddle_ocr(input_path)
@@ -137,7 +248,7 @@ def main():
 
     output_path = Path("ner_output") / (input_path.stem + ".json")
     with open(output_path, 'w') as f:
-        json.dump(results, f)
+        json.dump(results, f, default=json_default)
 
     print("Successfully generated NER output for this file.")
 
@@ -1,11 +1,13 @@
 import os
+import random
 import asyncio
 import aiohttp
 import aiofiles
-from sqlite3 import Connection
+from typing import Optional
 from datetime import datetime
-from parse import parse_report, ParseReportResult
+from parse import parse_reports, ParseReportResult
 from models import Report, DBWriteResult
+from db import connect
 from search import search_disclosures
 from timer import Timer
 
@@ -18,6 +20,16 @@ from timer import Timer
 
 TMP_DIR = "tmp"
 DB_FILE = "report.db"
+# Firing every download at once exhausts sockets and gets us throttled
+MAX_CONCURRENT_DOWNLOADS = 8
+# Every report is on the same host, so any more downloads than connections to it
+# would only wait on the connector
+MAX_CONNECTIONS_PER_HOST = MAX_CONCURRENT_DOWNLOADS
+DOWNLOAD_ATTEMPTS = 5
+# Seconds an idle connection is kept open for reuse, sparing later downloads a TLS handshake
+KEEPALIVE_TIMEOUT = 60
+# Reports are streamed to disk in chunks of this many bytes rather than held in memory
+DOWNLOAD_CHUNK_SIZE = 1 << 16
 
 #       _       _              _       __ _       _ _   _                 
 #    __| | __ _| |_ __ _    __| | ___ / _(_)_ __ (_) |_(_) ___  _ __  ___ 
@@ -40,40 +52,91 @@ ReportPath = str
 # 3) Writes all transactions belonging to newly written reports
 # 4) Rolls back any successful writes in transaction in case of failure
 # 5) Return result of operation
+#
+# All of the writes happen in a single transaction, committed once at the end
 def write_new_reports_to_db(
     parse_results: list[ParseReportResult]
 ) -> DBWriteResult:
-    conn = Connection(DB_FILE)
-    cur = conn.cursor()
+    conn = connect(DB_FILE)
     success_results: list[ParseReportResult] = [r for r in parse_results if r.success]
-    r: DBWriteResult = Report.db_write_many(cur, [r.data for r in success_results])
-    
+
     # TODO: The written transaction count doesn't reconcile, but it's off by a slight margin, so I wanted to write
-    # the records that are parsed for now, at the very least
+    # the records that are parsed for now, at the very least. The connection context manager commits
+    # on exit regardless of r.success and only rolls back if an exception is raised
     # if r.success:
     #     conn.commit()
     # else:
     #     conn.rollback()
-    conn.commit()
+    with conn:
+        cur = conn.cursor()
+        r: DBWriteResult = Report.db_write_many(cur, [r.data for r in success_results])
+
+    conn.close()
 
     return r
 
-# TODO: Description
-def parse_reports(report_directory: str) -> list[ParseReportResult]:
-    ps: list[ReportPath] = [os.path.join(report_directory, r) for r in os.listdir(report_directory)]
-    rs: list[ParseReportResult] = [parse_report(p) for p in ps]
+# Parses every report (PDF) in the given directory, in parallel (see parse_reports).
+# Results are in the same order as the directory listing
+def parse_downloaded_reports(report_directory: str) -> list[ParseReportResult]:
+    with os.scandir(report_directory) as it:
+        ps: list[ReportPath] = [e.path for e in it if e.is_file() and e.name.endswith(".pdf")]
 
-    return rs
+    rs: list[ParseReportResult] = parse_reports(ps)
 
-# TODO: Gemini slop
-async def download_file(session: aiohttp.ClientSession, link: str, index: int) -> None:
-    async with session.get(link) as response:
-        response.raise_for_status()
-        content = await response.read()
-        path = os.path.join(TMP_DIR, f"{index}.pdf")
+    return rs
 
-        async with aiofiles.open(path, "wb") as f:
-            await f.write(content)
+# Downloads the report at the given link once a slot in the semaphore frees up,
+# retrying with exponential backoff (plus jitter) on client errors and timeouts.
+# The last failure is re-raised
+async def download_file(
+    session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, link: str, index: int
+) -> None:
+    async with semaphore:
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            try:
+                async with session.get(link) as response:
+                    response.raise_for_status()
+                    path = os.path.join(TMP_DIR, f"{index}.pdf")
+
+                    async with aiofiles.open(path, "wb") as f:
+                        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                            await f.write(chunk)
+
+                return
+            # NOTE: The session's timeout raises a bare asyncio.TimeoutError, which
+            # isn't a ClientError
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == DOWNLOAD_ATTEMPTS - 1:
+                    raise
+
+                await asyncio.sleep(2 ** attempt + random.random())
+
+# The HTTP session (and its connection pool) shared by every download in this
+# process. Created lazily by get_session and closed by close_session
+_session: Optional[aiohttp.ClientSession] = None
+_session_lock = asyncio.Lock()
+
+async def get_session() -> aiohttp.ClientSession:
+    global _session
+
+    async with _session_lock:
+        if _session is None or _session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONCURRENT_DOWNLOADS,
+                limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT
+            )
+            _session = aiohttp.ClientSession(connector=connector)
+
+    return _session
+
+async def close_session() -> None:
+    global _session
+
+    async with _session_lock:
+        if _session is not None:
+            await _session.close()
+            _session = None
 
 # 1) Fetches the PDF links for all reports from the current year
 # 2) Writes them to a temporary directory on the runner's disk
@@ -83,13 +146,14 @@ async def download_reports() -> str:
     current_year: int = datetime.now().year
     report_links = search_disclosures(filing_year=current_year)
 
-    async with aiohttp.ClientSession() as session:
-        tasks = []
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+    session: aiohttp.ClientSession = await get_session()
+    tasks = []
 
-        for index, l in enumerate(report_links):
-            tasks.append(download_file(session, l, index))
+    for index, l in enumerate(report_links):
+        tasks.append(download_file(session, semaphore, l, index))
 
-        await asyncio.gather(*tasks)
+    await asyncio.gather(*tasks)
 
     # TODO: For now, files are writing to same directory on every run, which means
     # directory must be empty before each run. We could create a new directory
@@ -122,10 +186,13 @@ async def main():
     os.makedirs(TMP_DIR, exist_ok=True)
 
     with Timer("downloading all reports for current calendar year"):
-        report_directory: str = await download_reports()
+        try:
+            report_directory: str = await download_reports()
+        finally:
+            await close_session()
 
     with Timer("parsing all downloaded reports"):
-        rs: list[ParseReportResult] = parse_reports(TMP_DIR)
+        rs: list[ParseReportResult] = parse_downloaded_reports(TMP_DIR)
 
 
     with Timer("writing new reports to db"):
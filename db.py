@@ -1,7 +1,8 @@
 from dataclasses import dataclass
+from sqlite3 import Connection
 
 # Represents the actual and expected number of rows affected by a write to the database
-@dataclass
+@dataclass(slots=True)
 class DBWrite:
     actual: int
     expected: int
@@ -15,3 +16,21 @@ def create_placeholders_string(parameter_count: int) -> str:
     placeholders = f"({', '.join(['?'] * parameter_count)})"
 
     return placeholders
+
+# Maximum number of parameters bound to a single statement. SQLite builds before
+# 3.32 cap this at 999, so lists of IDs are queried in chunks of this size
+MAX_QUERY_PARAMETERS = 500
+
+# Opens a connection to the database at the given path, tuned for batch writes:
+# - The write-ahead log lets the batch commit without rewriting the main file
+# - With WAL, syncing at NORMAL (on checkpoint, not on every commit) is still safe
+# - Temporary tables and indices are kept in memory
+# - The page cache is raised to 64 MiB (negative values are in KiB)
+def connect(db_file: str) -> Connection:
+    conn = Connection(db_file)
+    conn.execute("pragma journal_mode=WAL")
+    conn.execute("pragma synchronous=NORMAL")
+    conn.execute("pragma temp_store=MEMORY")
+    conn.execute("pragma cache_size=-65536")
+
+    return conn
@@ -1,15 +1,20 @@
 import re
 import sqlite3
-import zlib
-from dataclasses import dataclass
-from typing import Optional, TypeVar, Generic
+import hashlib
+import itertools
+import operator
+from dataclasses import dataclass, field
+from typing import Optional, TypeVar, Generic, Iterator
 from enum import Enum
-from datetime import date, datetime
-from db import DBWrite, create_placeholders_string
+from datetime import date
+from db import DBWrite, create_placeholders_string, MAX_QUERY_PARAMETERS
 
 T = TypeVar("T")
 
-@dataclass
+# NOTE: Models are slotted (no per-instance __dict__), as thousands of them are created
+# per run and only ever have their fields read. Subclasses that add no fields declare
+# empty __slots__ to keep it that way
+@dataclass(slots=True)
 class Result(Generic[T]):
     success: bool
     message: str # Always empty if success is True
@@ -21,58 +26,62 @@ filings of House Financial Disclosure report database. Here are some notes
 common to all models
 
 Parsing:
-- The GROUP_PATTERN attribute is meant to match the attributes of the model in a
-block of text that _just_ contains the model's data. For this reason, it'll contain
-named capture groups for the easy construction of the model instance
-- The PATTERN attribute is to match the object in a larger block of text (ie. that
-contains the model's data along with data from other models). This attribute likely 
-does not have (named) capture groups, as it's meant for embedding in a larger pattern.
-For this reason, too, the pattern is not compiled, as compiled patterns cannot be
-embedded in another pattern
-- The result of the separation from above is that there is some duplicate logic across
-the two patterns, as they represent the same model, just with a different level of
-granularity each
+- Transaction.scan walks a block of text that _just_ contains transactions in a
+single pass, and yields a TransactionMatch for each one, holding the raw text of
+each of its attributes. Only the fixed shape part of a transaction (its body, see
+Transaction.BODY_PATTERN) is matched with a regex
+- Each model's from_match parses the raw text of its attribute into an instance of
+the model (eg. Asset.from_match), wrapped in a Result. Most of them take the text
+apart with string operations or a lookup rather than a second pattern, as its shape
+is already known from the scan
+- The PATTERN attribute that remains on some models (eg. Date, AmountRange) is to
+match the object in a larger block of text. It doesn't have (named) capture groups
+and isn't compiled, as it's meant for embedding in a larger pattern
 
 ORM:
 """
 
 class AssetParseResult(Result["Asset"]):
-    pass
+    __slots__ = ()
 
 # Represents the asset transacted upon
-@dataclass
+@dataclass(slots=True)
 class Asset:
     name: str
     type: str
     ticker: Optional[str]
-    PATTERN = r".*?\[.*?\]"
-    GROUP_PATTERN = re.compile(r"""
-        # Name group (required)
-        (?P<name>.*?)\s
-
-        # Ticker group (optional)
-        (?:
-            \((?P<ticker>.*)\)\s
-        )?
-
-        # Type group (required)
-        \[(?P<type>.*?)\]
-    """, re.VERBOSE | re.DOTALL)
 
+    # The asset is always written as "<name> (<ticker>) [<type>]", where the ticker
+    # is optional. Rather than with a pattern, it's taken apart with string operations
+    # from the right, since the type is the last bracket and the ticker is the last
+    # parenthesis right before it:
+    # 1) The type is between the last opening bracket and the closing one after it
+    # 2) If what's before the type ends with a closing parenthesis, the ticker is
+    # between it and the last opening parenthesis
+    # 3) Everything before that is the name
     @staticmethod
     def from_match(g: str) -> AssetParseResult:
-        m: Optional[re.Match] = Asset.GROUP_PATTERN.search(g)
+        type_open = g.rfind("[")
+        type_close = g.find("]", type_open + 1) if type_open != -1 else -1
+        head = g[:type_open].rstrip()
+        name = head
+        ticker: Optional[str] = None
 
-        if not m:
+        if head.endswith(")"):
+            ticker_open = head.rfind("(")
+
+            if ticker_open != -1:
+                name = head[:ticker_open].rstrip()
+                ticker = head[ticker_open + 1:-1]
+
+        if type_close == -1 or not name:
             return AssetParseResult(
                 success=False,
                 message=f"Asset attributes could not be extracted from asset pattern match '{g}'",
                 data=None
             )
 
-        name = m.group("name")
-        ticker = m.group("ticker")
-        type = m.group("type")
+        type = g[type_open + 1:type_close]
         a = Asset(name, type, ticker)
 
         return AssetParseResult(
@@ -82,18 +91,20 @@ class Asset:
         )
 
 class FilingStatusParseResult(Result["FilingStatus"]):
-    pass
+    __slots__ = ()
 
 class FilingStatus(Enum):
     NEW = "new"
 
     @staticmethod
     def from_match(g: str) -> FilingStatusParseResult:
-        if g == "New":
+        data: Optional[FilingStatus] = FILING_STATUSES.get(g)
+
+        if data is not None:
             return FilingStatusParseResult(
                 success=True,
                 message="",
-                data=FilingStatus.NEW
+                data=data
             )
         else:
             return FilingStatusParseResult(
@@ -102,8 +113,13 @@ class FilingStatus(Enum):
                 data=None
             )
 
+# Filing statuses, keyed by how they're written in the report
+FILING_STATUSES: dict[str, FilingStatus] = {
+    "New": FilingStatus.NEW,
+}
+
 class TransactionTypeParseResult(Result["TransactionType"]):
-    pass
+    __slots__ = ()
 
 class TransactionType(Enum):
     PURCHASE = "purchase"
@@ -112,19 +128,9 @@ class TransactionType(Enum):
 
     @staticmethod
     def from_match(g: str) -> TransactionTypeParseResult:
-        success = True
-        message = ""
-        data = None
-
-        if g == "P":
-            data = TransactionType.PURCHASE
-        elif g == "S":
-            data = TransactionType.SALE
-        elif g == "S (partial)":
-            data = TransactionType.SALE_PARTIAL
-        else:
-            success=False
-            message=f"Transaction type '{g}' not recognized"
+        data: Optional[TransactionType] = TRANSACTION_TYPES.get(g)
+        success = data is not None
+        message = "" if success else f"Transaction type '{g}' not recognized"
 
         return TransactionTypeParseResult(
             success=success,
@@ -132,12 +138,20 @@ class TransactionType(Enum):
             data=data
         )
 
+# Transaction types, keyed by how they're written in the report
+TRANSACTION_TYPES: dict[str, TransactionType] = {
+    "P": TransactionType.PURCHASE,
+    "S": TransactionType.SALE,
+    "S (partial)": TransactionType.SALE_PARTIAL,
+}
+
 class DateParseResult(Result["Date"]):
-    pass
+    __slots__ = ()
 
 # This is just being extended to implement a method to create an instance
 # from a capturing group of it in the transaction regex pattern
 class Date(date):
+    __slots__ = ()
     FORMAT = "%m/%d/%Y"
     PATTERN = r"\d{1,2}/\d{1,2}/\d{4}"
 
@@ -150,13 +164,18 @@ class Date(date):
         return Date.from_date(date.today())
 
     # Writes this date as a string using the format above
+    # NOTE: Built by hand rather than with strftime, as the format is fixed
+    # and this is called for every date written to the database
     def format(self) -> str:
-        return self.strftime(Date.FORMAT)
+        return f"{self.month:02d}/{self.day:02d}/{self.year:04d}"
 
     @staticmethod
     def from_match(g: str) -> "DateParseResult":
         try:
-            d = Date.from_date(datetime.strptime(g, Date.FORMAT).date())
+            # NOTE: The pattern already guarantees the (month/day/year) shape of the
+            # match, so it's split by hand rather than going through strptime
+            month, day, year = g.split("/")
+            d = Date(int(year), int(month), int(day))
 
             return DateParseResult(
                 success=True,
@@ -171,38 +190,32 @@ class Date(date):
             )
 
 class AmountRangeParseResult(Result["AmountRange"]):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots=True)
 class AmountRange:
     min: int
     max: int
     MONETARY_AMOUNT_PATTERN = r"\$[\d,]*"
     PATTERN = fr"{MONETARY_AMOUNT_PATTERN}\s-\s{MONETARY_AMOUNT_PATTERN}"
-    GROUP_PATTERN = re.compile(r"""
-        # Min group
-        \$(?P<min>\d+)\s
-        -
-        # Max group
-        \s\$(?P<max>\d+)
-    """, re.VERBOSE | re.DOTALL)
 
+    # The match is always "$<min> - $<max>" (see PATTERN), so rather than with
+    # a second pattern, it's split on the dash and each side is stripped of its
+    # dollar sign and commas (eg. $15,001 -> 15001)
     @staticmethod
     def from_match(g: str) -> AmountRangeParseResult:
-        # NOTE: Commas are removed in a first pass cus the regex looks
-        # worse if we try to create capturing groups that exclude it
-        g = re.sub(",", "", g)
-        m: Optional[re.Match] = AmountRange.GROUP_PATTERN.search(g)
+        min_text, _, max_text = g.partition("-")
 
-        if not m:
+        try:
+            min = int(min_text.strip().lstrip("$").replace(",", ""))
+            max = int(max_text.strip().lstrip("$").replace(",", ""))
+        except ValueError:
             return AmountRangeParseResult(
                 success=False,
                 message=f"Amount range attributes could not be extracted from amount range pattern match '{g}'",
                 data=None
             )
 
-        min = int(m.group("min"))
-        max = int(m.group("max"))
         ar = AmountRange(min, max)
 
         return AmountRangeParseResult(
@@ -212,11 +225,27 @@ class AmountRange:
         )
 
 class TransactionParseResult(Result["Transaction"]):
-    pass
+    __slots__ = ()
+
+# The unparsed attributes of a single transaction, as sliced out of a
+# transactions block by Transaction.scan
+@dataclass(slots=True)
+class TransactionMatch:
+    asset: str
+    type: str
+    transaction_date: str
+    notification_date: str
+    amount_range: str
+    filing_status: str
+    subholding_of: Optional[str]
+    description: Optional[str]
+    comment: Optional[str]
+    block: str # The transactions block the match was found in
+    span: tuple[int, int] # The start and end of the full text of the transaction in the block
 
 # Represents a transaction made by a member of the House of 
 # Representatives
-@dataclass
+@dataclass(slots=True)
 class Transaction:
     asset: Asset
     type: TransactionType
@@ -227,14 +256,17 @@ class Transaction:
     subholding_of: Optional[str]
     description: Optional[str]
     comment: Optional[str]
-    raw_text: str
+    # NOTE: Rather than a copy of its own text, each transaction keeps the span of
+    # it in the transactions block, which is shared by every transaction in it
+    source_text: str = field(repr=False, compare=False)
+    raw_text_span: tuple[int, int]
     SUBHOLDING_OF_PATTERN = r"S\sO:"
     DESCRIPTION_PATTERN = r"D:"
     COMMENT_PATTERN = r"C:"
-    GROUP_PATTERN = re.compile(fr"""
-        # Asset group (eg. Amazon (AMZN) [ST])
-        \s*(?P<asset>{Asset.PATTERN})
-    
+    # Everything from the transaction type up to the filing status marker has a
+    # fixed shape, so it's matched in place (right after the closing bracket of
+    # an asset's type) rather than searched for
+    BODY_PATTERN = re.compile(fr"""
         # Transaction type group
         \s*(?P<type>
         P
@@ -251,121 +283,225 @@ class Transaction:
         # Amount range group
         \s*(?P<amount_range>{AmountRange.PATTERN})
     
-        # Filing status group (Required starting point of transaction footer)
-        \s*F\sS:\s(?P<filing_status>.*?)\s
-        (?=({SUBHOLDING_OF_PATTERN}|{DESCRIPTION_PATTERN}|{COMMENT_PATTERN}|\Z|{Asset.PATTERN}))
-    
-        # Subholding of group (Optional)
-        (?:\s*{SUBHOLDING_OF_PATTERN}\s*(?P<subholding_of>.*?)\s
-        (?=({DESCRIPTION_PATTERN}|{COMMENT_PATTERN}|\Z|{Asset.PATTERN})))?
-    
-        # Comment group (Optional)
-        (?:\s*{COMMENT_PATTERN}\s*(?P<comment>.*?)\s
-        (?=({DESCRIPTION_PATTERN}|\Z|{Asset.PATTERN})))?
-    
-        # Description group (Optional)
-        (?:\s*{DESCRIPTION_PATTERN}\s*(?P<description>.*?)\s
-        (?=({COMMENT_PATTERN}|\Z|{Asset.PATTERN})))?
-    
-        # Lookahead: Assert that the transaction is followed by the start of a new one
-        # or the end of the entire string, which prevents the final optional group from
-        # consuming the start of the next transaction asset
-        (?=\s*({Asset.PATTERN}|\Z))
-    """, re.VERBOSE | re.DOTALL)
+        # Filing status marker (Required starting point of transaction footer)
+        \s*F\sS:\s
+    """, re.VERBOSE)
+    # Separates the body of every transaction from its footer
+    FILING_STATUS_MARKER_PATTERN = re.compile(r"F\sS:\s")
+    # Start of one of the optional footer fields, matched in place
+    FOOTER_FIELD_PATTERN = re.compile(fr"""
+        \s*(?P<marker>{SUBHOLDING_OF_PATTERN}|{DESCRIPTION_PATTERN}|{COMMENT_PATTERN})\s*
+    """, re.VERBOSE)
+    # End of a footer value in the last transaction of a block (ie. the start of the next field)
+    FOOTER_VALUE_END_PATTERN = re.compile(
+        fr"\s(?={SUBHOLDING_OF_PATTERN}|{DESCRIPTION_PATTERN}|{COMMENT_PATTERN})"
+    )
+    WHITESPACE_PATTERN = re.compile(r"\s")
+    # Transaction attribute each footer field marker introduces, keyed by its first character
+    FOOTER_FIELDS = {"S": "subholding_of", "D": "description", "C": "comment"}
     TABLE_NAME = "transactions"
+    # Columns of the transactions table, in order (see schemas/tables.sql)
+    COLUMN_NAMES = (
+        "transaction_id",
+        "report_id",
+        "asset_name",
+        "asset_type",
+        "asset_ticker",
+        "filing_status",
+        "subholding_of",
+        "description",
+        "comment",
+        "type",
+        "transaction_date",
+        "notification_date",
+        "amount_min",
+        "amount_max",
+        "match_text",
+        "created_at",
+    )
+    COLUMN_COUNT = len(COLUMN_NAMES)
+    # NOTE: The schema is fixed, so the insert statement is only built once
+    INSERT_STATEMENT = f"insert into {TABLE_NAME} values {create_placeholders_string(COLUMN_COUNT)};"
+    # The match field, parser, and description (for failure messages) of each of the
+    # parsed attributes above, in the order they're declared
+    FIELD_PARSERS = (
+        ("asset", Asset.from_match, "Transaction asset"),
+        ("type", TransactionType.from_match, "Transaction type"),
+        ("transaction_date", Date.from_match, "Transaction date"),
+        ("notification_date", Date.from_match, "Notification date"),
+        ("amount_range", AmountRange.from_match, "Transaction amount range"),
+        ("filing_status", FilingStatus.from_match, "Transaction filing status"),
+    )
 
+    # The full text of the transaction, sliced out of the transactions block on demand
+    @property
+    def raw_text(self) -> str:
+        start, end = self.raw_text_span
+        return self.source_text[start:end]
+
+    # Scans a block of cleansed text that _just_ contains transactions data, left to
+    # right and in a single pass, yielding a match for each transaction as soon as
+    # it's found. Every transaction contains exactly one filing status marker (F S:),
+    # so the block is split on those. For each marker:
+    # 1) The last asset type bracket (eg. [ST]) before it must be followed by a
+    # transaction body that ends at the marker. Everything since the end of the
+    # previous transaction up to that bracket is the asset
+    # 2) Reads the filing status and any of the optional footer fields that follow it
+    # 3) Resumes from the end of the footer
+    #
+    # NOTE: Nothing separates the footer of a transaction from the asset of the next one,
+    # so while more transactions follow, each footer value is cut at its first word and
+    # the rest bleeds into the next asset name (see README). The footer values of the
+    # last transaction run until the next footer marker or the end of the block
     @staticmethod
-    def from_match(m: re.Match) -> TransactionParseResult:
-        asset_result = Asset.from_match(m.group("asset"))
-        type_result = TransactionType.from_match(m.group("type"))
-        transaction_date_result = Date.from_match(m.group("transaction_date"))
-        notification_date_result = Date.from_match(m.group("notification_date"))
-        amount_result = AmountRange.from_match(m.group("amount_range"))
-        filing_status_result = FilingStatus.from_match(m.group("filing_status"))
-        subholding_of = m.group("subholding_of")
-        description = m.group("description")
-        comment = m.group("comment")
-        match_text = m.group()
-
-        if not asset_result.success:
-            return TransactionParseResult(
-                success=False,
-                message=f"Transaction asset could not be created: {asset_result.message}",
-                data=None
-            )
-        elif not type_result.success:
-            return TransactionParseResult(
-                success=False,
-                message=f"Transaction type could not be created: {type_result.message}",
-                data=None
-            )
-        elif not transaction_date_result.success:
-            return TransactionParseResult(
-                success=False,
-                message=f"Transaction date could not be created: {transaction_date_result.message}",
-                data=None
+    def scan(b: str) -> Iterator["TransactionMatch"]:
+        pos = 0
+        marker: Optional[re.Match] = Transaction.FILING_STATUS_MARKER_PATTERN.search(b)
+
+        while marker:
+            next_marker = Transaction.FILING_STATUS_MARKER_PATTERN.search(b, marker.end())
+            start = pos
+            body: Optional[re.Match] = None
+            bracket_open = b.rfind("[", pos, marker.start())
+            bracket_close = b.find("]", bracket_open, marker.start()) if bracket_open != -1 else -1
+
+            if bracket_close != -1:
+                body = Transaction.BODY_PATTERN.match(b, bracket_close + 1)
+
+            # The marker isn't part of a transaction, so the text up to it
+            # is left to the asset of the next one
+            if body is None or body.end() != marker.end():
+                marker = next_marker
+                continue
+
+            asset = b[start:body.start()].lstrip()
+            # NOTE: Fetched in a single call rather than one per group
+            type, transaction_date, notification_date, amount_range = body.group(
+                "type", "transaction_date", "notification_date", "amount_range"
             )
-        elif not notification_date_result.success:
-            return TransactionParseResult(
-                success=False,
-                message=f"Notification date could not be created: {notification_date_result.message}",
-                data=None
-            )
-        elif not amount_result.success:
-            return TransactionParseResult(
-                success=False,
-                message=f"Transaction amount range could not be created: {amount_result.message}",
-                data=None
-            )
-        elif not filing_status_result.success:
-            return TransactionParseResult(
-                success=False,
-                message=f"Transaction filing status could not be created: {filing_status_result.message}",
-                data=None
+            is_last = next_marker is None
+            filing_status, pos = Transaction._read_footer_value(b, body.end(), is_last)
+            footer: dict[str, Optional[str]] = {f: None for f in Transaction.FOOTER_FIELDS.values()}
+
+            while m := Transaction.FOOTER_FIELD_PATTERN.match(b, pos):
+                field = Transaction.FOOTER_FIELDS[m.group("marker")[0]]
+
+                if footer[field] is not None:
+                    break
+
+                footer[field], pos = Transaction._read_footer_value(b, m.end(), is_last)
+
+            yield TransactionMatch(
+                asset=asset,
+                type=type,
+                transaction_date=transaction_date,
+                notification_date=notification_date,
+                amount_range=amount_range,
+                filing_status=filing_status,
+                subholding_of=footer["subholding_of"],
+                description=footer["description"],
+                comment=footer["comment"],
+                block=b,
+                span=(start, pos)
             )
+            marker = next_marker
+
+    # Returns the footer value starting at the given position, along with the
+    # position right after the whitespace that ends it
+    @staticmethod
+    def _read_footer_value(b: str, pos: int, is_last: bool) -> tuple[str, int]:
+        if is_last:
+            m = Transaction.FOOTER_VALUE_END_PATTERN.search(b, pos)
         else:
-            t = Transaction(
-                asset_result.data,
-                type_result.data,
-                transaction_date_result.data,
-                notification_date_result.data,
-                amount_result.data,
-                filing_status_result.data,
-                subholding_of,
-                description,
-                comment,
-                match_text
-            )
+            m = Transaction.WHITESPACE_PATTERN.search(b, pos)
 
-            return TransactionParseResult(
-                success=True,
-                message="",
-                data=t
-            )
+        if not m:
+            return b[pos:], len(b)
+
+        return b[pos:m.start()], m.end()
+
+    # Constructs a transaction from a match, parsing its attributes in the order
+    # they're declared above with the parsers in FIELD_PARSERS. Stops at the first
+    # attribute that fails to parse
+    @staticmethod
+    def from_match(m: "TransactionMatch") -> TransactionParseResult:
+        values: list = []
+
+        for match_field, parse, description in Transaction.FIELD_PARSERS:
+            r: Result = parse(getattr(m, match_field))
+
+            if not r.success:
+                return TransactionParseResult(
+                    success=False,
+                    message=f"{description} could not be created: {r.message}",
+                    data=None
+                )
+
+            values.append(r.data)
+
+        t = Transaction(
+            *values,
+            m.subholding_of,
+            m.description,
+            m.comment,
+            m.block,
+            m.span
+        )
+
+        return TransactionParseResult(
+            success=True,
+            message="",
+            data=t
+        )
 
 class TransactionsParseResult(Result[list[Transaction]]):
-    pass
+    __slots__ = ()
 
 class Transactions:
+    # Fetches the attributes of a transaction that make up its row (see to_db_tuples)
+    # in one C-level call, rather than a chain of attribute lookups per row
+    DB_FIELDS = operator.attrgetter(
+        "asset.name",
+        "asset.type",
+        "asset.ticker",
+        "filing_status.value",
+        "subholding_of",
+        "description",
+        "comment",
+        "type",
+        "transaction_date",
+        "notification_date",
+        "amount.min",
+        "amount.max",
+        "raw_text",
+    )
 
     # Constructs a list of transactions from a block of cleansed
     # text that _just_ contains transactions data
     @staticmethod
     def from_transactions_block(b: str) -> TransactionsParseResult:
-        ms: list[re.Match] = list(Transaction.GROUP_PATTERN.finditer(b))
+        # NOTE: Matches are consumed as they're scanned, in a single pass,
+        # rather than materializing the matches and results as lists first
+        ts: list[Transaction] = []
+        failure_messages: list[str] = []
+
+        for m in Transaction.scan(b):
+            r: TransactionParseResult = Transaction.from_match(m)
+
+            if r.success:
+                ts.append(r.data)
+            else:
+                failure_messages.append(r.message)
 
-        if not ms:
+        if not ts and not failure_messages:
             return TransactionsParseResult(
                 success=False,
                 message="No transactions matches were found in the transactions block",
                 data=None
             )
 
-        rs: list[TransactionParseResult] = [Transaction.from_match(m) for m in ms]
-        failures: list[TransactionParseResult] = [r for r in rs if not r.success]
-
-        if failures:
-            joined_failure_messages = "\n".join([f.message for f in failures])
+        if failure_messages:
+            joined_failure_messages = "\n".join(failure_messages)
             message = f"Failure to construct transactions from block:\n{joined_failure_messages}"
             return TransactionsParseResult(
                 success=False,
@@ -376,53 +512,92 @@ class Transactions:
             return TransactionsParseResult(
                 success=True,
                 message="",
-                data=[r.data for r in rs]
+                data=ts
             )
 
-    # Creates a list of tuples, one for each transaction in the given list,
-    # that'll be used as the data inserted into database
+    # Finishes the transaction ID hash of a row, given the hash of its report's prefix
     @staticmethod
-    def to_db_tuples(ts: list[list[Transaction]], filing_ids: list[int]) -> list[tuple]:
-        if len(ts) != len(filing_ids):
-            # TODO: Result object needed here
-            return []
-
-        nested_transactions_data: list[list[tuple]] = [
-            [
-                (
-                    zlib.crc32(f"{filing_id}-{t.asset.name}-{t.type}-{t.transaction_date}".encode("utf-8")) & 0xFFFFFFFF,
-                    filing_id,
-                    t.asset.name,
-                    t.asset.type,
-                    t.asset.ticker,
-                    t.filing_status.value,
-                    t.subholding_of,
-                    t.description,
-                    t.comment,
-                    t.type.value,
-                    t.transaction_date.format(),
-                    t.notification_date.format(),
-                    t.amount.min,
-                    t.amount.max,
-                    t.raw_text,
-                    Date.today().format()
-                )
-                for t in rts
-            ]
-            for rts, filing_id in zip(ts, filing_ids)
-        ]
-        flattened_transactions_data: list[tuple] = [t for rts in nested_transactions_data for t in rts]
-        
-        return flattened_transactions_data
+    def transaction_id(filing_id_hash, row_key: bytes) -> int:
+        h = filing_id_hash.copy()
+        h.update(row_key)
+        return int.from_bytes(h.digest(), "big") & 0x7FFFFFFFFFFFFFFF
+
+    # Lazily creates a tuple for each transaction in the given reports, that'll be
+    # used as the data inserted into database. The tuples are produced as they're
+    # consumed (eg. by executemany), so no list of every row is ever built
+    @staticmethod
+    def to_db_tuples(rs: list["Report"]) -> Iterator[tuple]:
+        # NOTE: Computed once rather than per row, since it's the same for every row
+        created_at: str = Date.today().format()
+
+        return itertools.chain.from_iterable(
+            Transactions._report_db_tuples(r, created_at) for r in rs
+        )
+
+    # Creates a column-oriented view of the transactions in the given reports: a list
+    # of values per column of the transactions table, keyed by column name. This is
+    # the shape columnar tools expect (eg. pandas.DataFrame(columns)), without making
+    # any of them a dependency
+    @staticmethod
+    def to_columns(rs: list["Report"]) -> dict[str, list]:
+        # NOTE: The rows are transposed with zip, which does it in C
+        columns = list(zip(*Transactions.to_db_tuples(rs))) or [()] * Transaction.COLUMN_COUNT
+
+        return {name: list(c) for name, c in zip(Transaction.COLUMN_NAMES, columns)}
+
+    # Yields the tuple of each transaction in a single report
+    #
+    # The transaction ID is a 64-bit BLAKE2b digest of "<filing ID>-<asset name>-<type>-<date>",
+    # masked to fit SQLite's signed integer. The "<filing ID>-" prefix is hashed once per
+    # report and each row continues from a copy of that state
+    @staticmethod
+    def _report_db_tuples(r: "Report", created_at: str) -> Iterator[tuple]:
+        filing_id = r.filing_id
+        filing_id_hash = hashlib.blake2b(f"{filing_id}-".encode("utf-8"), digest_size=8)
+
+        db_fields = Transactions.DB_FIELDS
+
+        for t in r.transactions:
+            (
+                asset_name, asset_type, ticker, filing_status, subholding_of, description,
+                comment, type, transaction_date, notification_date, amount_min, amount_max,
+                raw_text
+            ) = db_fields(t)
+
+            yield (
+                Transactions.transaction_id(
+                    filing_id_hash,
+                    b"-".join((
+                        asset_name.encode("utf-8"),
+                        str(type).encode("utf-8"),
+                        str(transaction_date).encode("utf-8")
+                    ))
+                ),
+                filing_id,
+                asset_name,
+                asset_type,
+                ticker,
+                filing_status,
+                subholding_of,
+                description,
+                comment,
+                type.value,
+                transaction_date.format(),
+                notification_date.format(),
+                amount_min,
+                amount_max,
+                raw_text,
+                created_at
+            )
 
 class ReportParseResult(Result["Report"]):
-    pass
+    __slots__ = ()
 
 # NOTE: Data is present _regardless_ of success as long as the write went through
 class DBWriteResult(Result[DBWrite]):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots=True)
 class Report:
     filing_id: int
     representative_name: str
@@ -445,6 +620,14 @@ class Report:
         \s(?P<signing_date>{Date.PATTERN})
     """, re.VERBOSE | re.DOTALL)
     TABLE_NAME = "reports"
+    # Number of columns in the reports table (see schemas/tables.sql)
+    COLUMN_COUNT = 4
+    INSERT_STATEMENT = f"insert into {TABLE_NAME} values {create_placeholders_string(COLUMN_COUNT)};"
+    # Selects which of a full chunk of filing IDs are already present. Only the
+    # last chunk of a batch can be shorter and need its own statement
+    PRESENT_FILING_IDS_QUERY = f"""
+select report_id from {TABLE_NAME} where report_id in {create_placeholders_string(MAX_QUERY_PARAMETERS)}
+    """
 
     # NOTE: The transactions probably could be extracted from the text, but 
     # the Report object was an afterthought, and I don't care enough to 
@@ -505,28 +688,46 @@ class Report:
     # the set/list present in the database
     # 3) Writes new reports
     # 4) Writes new transactions
+    #
+    # NOTE: All of the above happens in a single transaction, which is begun here
+    # (unless the connection is already in one) with the write lock taken up front,
+    # so no other writer can slip in between the read in step 1 and the writes. 
+    # Committing or rolling it back is left to the owner of the connection
     @staticmethod
     def db_write_many(cur: sqlite3.Cursor, rs: list["Report"]) -> DBWriteResult:
+        if not cur.connection.in_transaction:
+            cur.execute("begin immediate")
+
         # Returns a list of reports, filtered from the given list of reports, whose 
         # filing IDs are not present in the given list of filing IDs
         def _discard_present_reports(
             cur: sqlite3.Cursor, rs: list["Report"], 
         ) -> list["Report"]:
             filing_ids: list[int] = [r.filing_id for r in rs]
-            placeholders_string = create_placeholders_string(len(filing_ids))
-            filing_ids_query = f"""
-select report_id from reports where report_id in ({', '.join(['?'] * len(filing_ids))})
-            """
-            # TODO: There is no protection against/visibility into a failure here
-            cur.execute(filing_ids_query, tuple(filing_ids))
-            # NOTE: No matter how many rows are selected, each row is still a tuple
-            present_filing_ids = [t[0] for t in cur.fetchall()]
+            present_filing_ids: set[int] = set()
+
+            # NOTE: Queried in chunks to stay under SQLite's bound parameter limit
+            for i in range(0, len(filing_ids), MAX_QUERY_PARAMETERS):
+                chunk: list[int] = filing_ids[i:i + MAX_QUERY_PARAMETERS]
+
+                if len(chunk) == MAX_QUERY_PARAMETERS:
+                    filing_ids_query = Report.PRESENT_FILING_IDS_QUERY
+                else:
+                    placeholders_string = create_placeholders_string(len(chunk))
+                    filing_ids_query = f"""
+select report_id from {Report.TABLE_NAME} where report_id in {placeholders_string}
+                    """
+                # TODO: There is no protection against/visibility into a failure here
+                cur.execute(filing_ids_query, tuple(chunk))
+                # NOTE: No matter how many rows are selected, each row is still a tuple
+                present_filing_ids.update(t[0] for t in cur.fetchall())
+
             return [r for r in rs if r.filing_id not in present_filing_ids]
 
         reports_to_write: list["Report"] = _discard_present_reports(cur, rs)
 
-        # 1) Creates a batch insert SQL statement
-        # 2) Writes them using the given cursor
+        # 1) Creates the rows for the given reports
+        # 2) Writes them with the (prebuilt) batch insert SQL statement using the given cursor
         # TODO: Modify description of step below
         # 3) Returns true if the number of rows affected/inserted is equal
         # to the length of the list of reports given
@@ -534,13 +735,9 @@ select report_id from reports where report_id in ({', '.join(['?'] * len(filing_
             cur: sqlite3.Cursor, rs: list["Report"]
         ) -> DBWriteResult:
             reports_data: list[tuple] = Reports.to_db_tuples(rs)
-            placeholders_string = create_placeholders_string(len(reports_data[0]))
-            report_statement = f"""
-insert into {Report.TABLE_NAME} values {placeholders_string};
-            """
 
             try:
-                cur.executemany(report_statement, reports_data)
+                cur.executemany(Report.INSERT_STATEMENT, reports_data)
             except Exception as e:
                 return DBWriteResult(
                     success=False,
@@ -564,17 +761,10 @@ insert into {Report.TABLE_NAME} values {placeholders_string};
         def _batch_write_to_transactions_table(
             cur: sqlite3.Cursor, rs: list["Report"]
         ) -> DBWriteResult:
-            transactions_data = Transactions.to_db_tuples(
-                [r.transactions for r in rs],
-                [r.filing_id for r in rs]
-            )
-            placeholders_string = create_placeholders_string(len(transactions_data[0]))
-            transaction_statement = f"""
-insert into {Transaction.TABLE_NAME} values {placeholders_string};
-            """
+            transactions_data: Iterator[tuple] = Transactions.to_db_tuples(rs)
 
             try:
-                cur.executemany(transaction_statement, transactions_data)
+                cur.executemany(Transaction.INSERT_STATEMENT, transactions_data)
             except Exception as e:
                 return DBWriteResult(
                     success=False,
@@ -582,8 +772,8 @@ insert into {Transaction.TABLE_NAME} values {placeholders_string};
                     data=None
                 )
 
-            success = cur.rowcount == len(transactions_data)
             expected_write_count = sum([len(r.transactions) for r in rs])
+            success = cur.rowcount == expected_write_count
 
             return DBWriteResult(
                 success=success,
@@ -599,12 +789,13 @@ class Reports:
     # that'll be used as the data inserted into database
     @staticmethod
     def to_db_tuples(rs: list[Report]) -> list[tuple]:
+        created_at: str = Date.today().format()
         reports_data: list[tuple] = [
             (
                 r.filing_id,
                 r.representative_name,
                 r.signed_date.format(),
-                Date.today().format()
+                created_at
             )
             for r in rs
         ]
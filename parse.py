@@ -1,5 +1,9 @@
+import os
 import argparse
+import functools
 import re
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
 from models import (
     Result,
     Transactions,
@@ -10,6 +14,13 @@ from models import (
 from dataclasses import dataclass
 from pypdf import PdfReader
 
+# PDFium extracts page text natively and is considerably faster than pypdf,
+# so it's used when installed. pypdf remains the fallback
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
 #                       _              _       
 #    ___ ___  _ __  ___| |_ __ _ _ __ | |_ ___ 
 #   / __/ _ \| '_ \/ __| __/ _` | '_ \| __/ __|
@@ -25,6 +36,23 @@ TABLE_FOOTER_PATTERN = re.compile(
     r'\* For the complete list of asset type',
     re.DOTALL
 )
+# Everything spliced out of the transactions block in its single pass: the repeated
+# table header of each page, and the Filing ID
+# NOTE: Randomly, the Filing ID which appears at the top of the report appears
+# at the end of the first page when the report's text is extracted. This
+# might be needed at some point though
+# NOTE: The Filing ID is written out rather than embedding Report.FILING_ID_PATTERN,
+# which captures the ID. Nothing is read from these matches, so there are no groups
+BLOCK_STRIP_PATTERN = re.compile(
+    fr'{TABLE_HEADER_PATTERN.pattern}|Filing ID #\d+',
+    re.DOTALL
+)
+# Number of reports handed to a parsing worker process at a time
+PARSE_CHUNK_SIZE = 4
+# Number of parsed reports memoized by parse_report. Kept small, as each one holds
+# every transaction's text, and a batch run (each worker process of which has its
+# own cache) never parses the same report twice
+PARSE_CACHE_SIZE = 8
 
 #       _       _              _       __ _       _ _   _                 
 #    __| | __ _| |_ __ _    __| | ___ / _(_)_ __ (_) |_(_) ___  _ __  ___ 
@@ -35,7 +63,7 @@ TABLE_FOOTER_PATTERN = re.compile(
 
 @dataclass
 class Args:
-    report_file_path: str
+    report_file_paths: list[str]
 
 # NOTE: In my decision to move more of the parsing logic into the data models
 # themselves, I was left with some parsing functionality for the report in
@@ -43,12 +71,12 @@ class Args:
 # came about. This script might just need to call a single function in the 
 # report data model to consolidate parsing logic there and avoid this clash.
 # This will do for now
-@dataclass
+@dataclass(slots=True)
 class ParseReportResult(Result[Report]):
     file_path: str
 
 class TransactionsBlockExtractionResult(Result[str]):
-    pass
+    __slots__ = ()
 
 #   _          _                    __                  _   _                 
 #  | |__   ___| |_ __   ___ _ __   / _|_   _ _ __   ___| |_(_) ___  _ __  ___ 
@@ -57,36 +85,100 @@ class TransactionsBlockExtractionResult(Result[str]):
 #  |_| |_|\___|_| .__/ \___|_|    |_|  \__,_|_| |_|\___|\__|_|\___/|_| |_|___/
 #               |_|                                                           
 
-# 1) Extracts the page-delimited raw text from the PDF at the given path
-# 2) Concatenates the pages together with a space in between each one
-# 3) Cleans the text and returns it
-def extract_cleansed_text(report_file_path: str) -> str:
+# Extracts and cleans the text of pages [start, stop) of the PDF at the given path,
+# with PDFium if it's installed and pypdf otherwise. Without a stop, extracts through
+# the last page. Lives at the top level (and reopens the PDF) so that it can run
+# in a worker process, as neither library's document objects pickle
+#
+# NOTE: Each page is cleaned as soon as it's extracted, so only one page's raw
+# text is ever held at a time (and workers send back the smaller, cleaned text)
+def extract_cleansed_pages_text(
+    report_file_path: str, start: int = 0, stop: Optional[int] = None
+) -> list[str]:
+    if pypdfium2 is not None:
+        pdf = pypdfium2.PdfDocument(report_file_path)
+
+        try:
+            stop = len(pdf) if stop is None else stop
+            return [
+                cleanse_raw_text(pdf[i].get_textpage().get_text_range())
+                for i in range(start, stop)
+            ]
+        finally:
+            pdf.close()
+
     reader = PdfReader(report_file_path)
-    raw_page_texts: list[str] = [p.extract_text() for p in reader.pages]
-    raw_text: str = " ".join(raw_page_texts)
-    cleansed_text: str = cleanse_raw_text(raw_text)
+    stop = len(reader.pages) if stop is None else stop
+
+    return [cleanse_raw_text(reader.pages[i].extract_text()) for i in range(start, stop)]
+
+# Returns the number of pages in the PDF at the given path
+def count_pages(report_file_path: str) -> int:
+    if pypdfium2 is not None:
+        pdf = pypdfium2.PdfDocument(report_file_path)
+
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    return len(PdfReader(report_file_path).pages)
+
+# 1) Extracts the cleaned text of each page of the PDF at the given path
+# 2) Concatenates the (non-empty) pages together with a space in between each
+# one, which is the same as cleaning the concatenated raw text, and returns it
+#
+# Text extraction is CPU bound, so given more than one worker, the pages are split
+# into contiguous ranges and extracted across that many processes (threads would
+# just contend for the GIL under pypdf). Defaults to a single process, since batch
+# callers already parse whole reports in parallel
+def extract_cleansed_text(report_file_path: str, max_workers: Optional[int] = None) -> str:
+    workers: int = max_workers or 1
+    page_count: int = 0
+
+    if workers > 1:
+        page_count = count_pages(report_file_path)
+        workers = min(workers, page_count)
+
+    if workers <= 1:
+        page_texts: list[str] = extract_cleansed_pages_text(report_file_path)
+    else:
+        bounds: list[int] = [page_count * i // workers for i in range(workers + 1)]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            ranges = executor.map(
+                extract_cleansed_pages_text,
+                [report_file_path] * workers,
+                bounds[:-1],
+                bounds[1:]
+            )
+            page_texts = [t for r in ranges for t in r]
+
+    cleansed_text: str = " ".join([t for t in page_texts if t])
 
     return cleansed_text
 
 # Given a full report's worth of text
-# 1) Finds matches for the table header
-# 2) Removes everything leading up (and including) to the first table 
-# header match
-# 3) Removes the remaining table header matches alone
-# 4) Removes everything after (and including) the first table footer match
+# 1) Finds the first match for the table header
+# 2) Finds the first table footer match after it
+# 3) Keeps everything between the two, splicing out any other table header
+# and the Filing ID along the way
+#
+# NOTE: Only the text between the first table header and the footer is searched
+# for what to splice out. Everything before (and including) the first one, and
+# after (and including) the footer, is never copied or scanned again
 def extract_transactions_block(raw_text: str) -> TransactionsBlockExtractionResult:
-    table_header_matches: list[re.Match] = list(TABLE_HEADER_PATTERN.finditer(raw_text))
+    table_header_match: Optional[re.Match] = TABLE_HEADER_PATTERN.search(raw_text)
 
-    if not table_header_matches:
+    if not table_header_match:
         return TransactionsBlockExtractionResult(
             success=False,
             message="No match was found for the table header",
             data=None
         )
 
-    raw_text = raw_text[table_header_matches[0].end():]
-    raw_text = re.sub(TABLE_HEADER_PATTERN, '', raw_text)
-    table_footer_match = TABLE_FOOTER_PATTERN.search(raw_text)
+    start: int = table_header_match.end()
+    table_footer_match = TABLE_FOOTER_PATTERN.search(raw_text, start)
 
     if not table_footer_match:
         return TransactionsBlockExtractionResult(
@@ -95,11 +187,15 @@ def extract_transactions_block(raw_text: str) -> TransactionsBlockExtractionResu
             data=None
         )
 
-    raw_text = raw_text[:table_footer_match.start()]
-    # NOTE: Randomly, the Filing ID which appears at the top of the report appears
-    # at the end of the first page when the report's text is extracted. This
-    # might be needed at some point though
-    transactions_block = re.sub(r'Filing ID #\d+', '', raw_text).strip()
+    end: int = table_footer_match.start()
+    pieces: list[str] = []
+
+    for m in BLOCK_STRIP_PATTERN.finditer(raw_text, start, end):
+        pieces.append(raw_text[start:m.start()])
+        start = m.end()
+
+    pieces.append(raw_text[start:end])
+    transactions_block = "".join(pieces).strip()
 
     return TransactionsBlockExtractionResult(
         success=True,
@@ -107,22 +203,45 @@ def extract_transactions_block(raw_text: str) -> TransactionsBlockExtractionResu
         data=transactions_block
     )
 
-# 1) Removes all null byte ASCII representations
-# 2) Replaces contiguous whitespace characters with a single space
+# 1) Removes all null byte ASCII representations, along with the U+FFFE
+# noncharacters PDFium emits in place of the report's small caps glyphs
+# 2) Replaces contiguous whitespace characters with a single space, and drops
+# any leading and trailing whitespace
+#
+# NOTE: Splitting on whitespace and joining is a pair of linear scans in C,
+# which is a good deal faster than the regex substitution over the whole text
 def cleanse_raw_text(raw_text: str) -> str:
-    cleansed_text = raw_text.replace('\x00', '')
-    cleansed_text = re.sub(r'\s+', ' ', cleansed_text)
+    cleansed_text = raw_text.replace('\x00', '').replace('\ufffe', '')
+    cleansed_text = ' '.join(cleansed_text.split())
 
     return cleansed_text
 
+# Parses the report at the given file path (see parse_report_version). Results are
+# memoized per version of the file (its modification time and size), so repeat
+# calls for an unchanged report skip extraction and parsing entirely
+#
+# NOTE: Repeat calls share the same result object, which should be treated as
+# read-only
+def parse_report(report_file_path: str, max_workers: Optional[int] = None) -> ParseReportResult:
+    st = os.stat(report_file_path)
+
+    return parse_report_version(report_file_path, st.st_mtime_ns, st.st_size, max_workers)
+
 # 1) Extract the text from the report at the given file path
 # 2) Extracts the block of transactions from
 # the document's raw text
-# 3) Finds the transaction matches using a regex pattern
-# 4) Constructs a transaction from each match
+# 3) Scans the block for the transactions in a single pass (see Transaction.scan)
+# 4) Constructs a transaction from each match, parsing its attributes with
+# string operations (see Transaction.from_match)
 # 5) Constructs a report from the raw text and list of transactions, returns report
-def parse_report(report_file_path: str) -> ParseReportResult:
-    cleansed_text: str = extract_cleansed_text(report_file_path)
+#
+# The modification time and size only key the cache. The max workers are passed
+# on to the text extraction (see extract_cleansed_text)
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_report_version(
+    report_file_path: str, mtime_ns: int, size: int, max_workers: Optional[int] = None
+) -> ParseReportResult:
+    cleansed_text: str = extract_cleansed_text(report_file_path, max_workers)
 
     if not cleansed_text:
         return ParseReportResult(
@@ -165,19 +284,48 @@ def parse_report(report_file_path: str) -> ParseReportResult:
         data=None if not rpr.success else rpr.data
     )
 
+# Parses each of the reports at the given paths. Parsing is CPU bound and
+# independent per report, so reports are spread across a pool of processes
+# (one per core). Results are in the same order as the given paths
+def parse_reports(report_file_paths: list[str]) -> list[ParseReportResult]:
+    if len(report_file_paths) <= 1:
+        return [parse_report(p) for p in report_file_paths]
+
+    with ProcessPoolExecutor() as executor:
+        return list(executor.map(parse_report, report_file_paths, chunksize=PARSE_CHUNK_SIZE))
+
+# Expands any directories among the given paths into the reports (PDFs) directly in them
+def collect_report_file_paths(paths: list[str]) -> list[str]:
+    report_file_paths: list[str] = []
+
+    for p in paths:
+        if os.path.isdir(p):
+            with os.scandir(p) as it:
+                report_file_paths.extend(sorted(
+                    e.path for e in it if e.is_file() and e.name.endswith(".pdf")
+                ))
+        else:
+            report_file_paths.append(p)
+
+    return report_file_paths
+
 def parse_arguments() -> Args:
     parser = argparse.ArgumentParser(
         prog='TODO',
         description='TODO'
     )
-    parser.add_argument('filename', help='Path to the financial discloure report to parse')
+    parser.add_argument(
+        'filenames',
+        nargs='+',
+        help='Paths to the financial discloure reports to parse, or directories of them'
+    )
     args: argparse.Namespace = parser.parse_args()
 
-    if not args.filename:
+    if not args.filenames:
         raise Exception()
     else:
         return Args(
-            report_file_path = args.filename
+            report_file_paths = collect_report_file_paths(args.filenames)
         )
 
 #                   _       
@@ -189,20 +337,24 @@ def parse_arguments() -> Args:
 
 def main():
     a: Args = parse_arguments()
-    prr: ParseReportResult = parse_report(a.report_file_path)
+    prrs: list[ParseReportResult] = parse_reports(a.report_file_paths)
 
-    if not prr.success:
-        print(prr.message)
-    else:
-        r: Report = prr.data
-        print(prr.file_path)
-        print(r.filing_id)
-        print(r.representative_name)
-        print(r.signed_date)
-        print()
-
-        for t in r.transactions:
-            print(str(t)+"\n\n")
+    for prr in prrs:
+        if not prr.success:
+            print(prr.message)
+        else:
+            r: Report = prr.data
+            print(prr.file_path)
+            print(r.filing_id)
+            print(r.representative_name)
+            print(r.signed_date)
+            print()
+
+            # NOTE: The text isn't part of a transaction's repr (only its span is
+            # kept), so it's printed after the structured fields
+            for t in r.transactions:
+                print(str(t))
+                print(t.raw_text+"\n\n")
 
 if __name__ == "__main__":
     main()
@@ -61,7 +61,8 @@ if __name__ == "__main__":
     add_parent_dir_to_path()
     import parse
     report_path = os.path.join(a.directory_name, "report.pdf")
-    cleansed_text = parse.extract_cleansed_text(report_path)
+    # A single report is being extracted, so its pages are spread across every core
+    cleansed_text = parse.extract_cleansed_text(report_path, max_workers=os.cpu_count())
 
     with open(os.path.join(a.directory_name, "cleansed.txt"), "w") as cleansed_text_file:
         cleansed_text_file.write(cleansed_text)
@@ -12,7 +12,7 @@ create table if not exists reports (
 
 -- Represents a transaction within a House Financial Disclosure report
 create table if not exists transactions (
-    -- An MD5 hash of the report ID, asset ID, and the transaction date
+    -- A 64-bit BLAKE2b hash of the report ID, asset name, transaction type, and the transaction date
     transaction_id integer primary key on conflict ignore,
     -- The ID of the report (record) this transaction belongs to
     report_id integer references report (report_id),
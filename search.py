@@ -2,14 +2,58 @@
 """
 Script to search House Financial Disclosures and extract PDF links.
 Usage: python house_disclosures.py [--last-name NAME] [--filing-year YEAR] [--state STATE] [--district DISTRICT]
+       python house_disclosures.py --serve < searches.txt
 """
 
 import argparse
+import codecs
 import re
+import shlex
 import sys
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from html.parser import HTMLParser
 
+# lxml tokenizes the HTML in C (libxml2) and calls back into the target below
+# from there, which is considerably faster than html.parser. It's optional, and
+# the LinkExtractor below is used when it's not installed
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# selectolax (Lexbor) is faster still: the rows are found with a CSS selector in C,
+# so Python only runs for the Filing cells. It's preferred over lxml when installed
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# Number of searches search_many runs at once, and so the size of the session's
+# connection pool
+SEARCH_WORKERS = 8
+
+# Seems like only relative links are produced by the search. They're made
+# absolute against this as they're collected
+BASE_URL = "https://disclosures-clerk.house.gov/"
+
+# Size of the chunks the search results are read from the socket in, and fed to
+# the parser in
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# How long (in seconds) a verification token is reused for before a new one is
+# fetched. The site's anti-forgery tokens last for the session, so this is well
+# within it, and a search rejected for its token refetches it regardless
+TOKEN_TTL = 15 * 60
+
+# Matches the CSRF token in the search page. Compiled once, and on bytes so that
+# the page never has to be decoded as a whole
+TOKEN_PATTERN = re.compile(
+    rb'name="__RequestVerificationToken"[^>]*value="([^"]+)"'
+)
+
+
 class LinkExtractor(HTMLParser):
     """
     HTML parser to extract <a> tags with 'PTR Original' filing type.
@@ -23,22 +67,29 @@ class LinkExtractor(HTMLParser):
         self.in_link_cell = False           # True when inside the Name column cell (which contains the link)
         self.in_filing_cell = False         # True when inside the Filing column cell
         self.current_link = None            # Stores the potential link from the <a> tag
-        self.current_filing_type = None     # Stores the text data from the Filing column cell
+        self.filing_type_parts = []         # Stores the text data from the Filing column cell, which may be split when fed in chunks
 
     def handle_starttag(self, tag, attrs):
         if tag == "tr":
             # Start of a new row
             self.in_tr = True
             self.current_link = None
-            self.current_filing_type = None
+            self.filing_type_parts = []
+
+        elif tag == "td" and self.in_tr:
+            # Only the data-label attribute is needed, so it's scanned for
+            # rather than building a dict of every attribute of the cell
+            label = None
+            for attr, value in attrs:
+                if attr == "data-label":
+                    label = value
+                    break
 
-        elif tag == "td":
             # Check if this is the 'Name' column (which contains the link)
-            attrs_dict = dict(attrs)
-            if self.in_tr and attrs_dict.get('data-label') == 'Name':
+            if label == 'Name':
                 self.in_link_cell = True
             # Check if this is the 'Filing' column
-            elif self.in_tr and attrs_dict.get('data-label') == 'Filing':
+            elif label == 'Filing':
                 self.in_filing_cell = True
 
         elif tag == "a" and self.in_link_cell:
@@ -58,20 +109,139 @@ class LinkExtractor(HTMLParser):
             # End of a row - perform the check
             self.in_tr = False
             # Check if we captured a link AND the filing type is exactly 'PTR Original'
-            if self.current_link and self.current_filing_type == "PTR Original":
-                self.links.append(self.current_link)
+            # Clean up the data (remove leading/trailing whitespace, etc.)
+            filing_type = "".join(self.filing_type_parts).strip()
+            if self.current_link and filing_type == "PTR Original":
+                link = self.current_link
+                self.links.append(
+                    BASE_URL + link if link.startswith("public_disc/") else link
+                )
             
             # Reset the data variables for the next row (though start_tag does this, too)
             self.current_link = None
-            self.current_filing_type = None
+            self.filing_type_parts = []
     
     def handle_data(self, data):
         # We only care about data inside the Filing column cell
         if self.in_filing_cell:
-            # Clean up the data (remove leading/trailing whitespace, etc.)
-            clean_data = data.strip()
-            if clean_data:
-                self.current_filing_type = clean_data
+            self.filing_type_parts.append(data)
+
+class LinkTarget:
+    """
+    lxml parser target to extract <a> tags with 'PTR Original' filing type.
+    Mirrors the state machine of LinkExtractor, but its callbacks are invoked
+    by lxml's C tokenizer.
+    """
+
+    def __init__(self):
+        self.links = []
+        # State tracking variables (see LinkExtractor)
+        self.in_tr = False
+        self.in_link_cell = False
+        self.in_filing_cell = False
+        self.current_link = None
+        self.filing_type_parts = []         # Text data from the Filing column cell, which lxml may split
+
+    def start(self, tag, attrib):
+        if tag == "tr":
+            self.in_tr = True
+            self.current_link = None
+            self.filing_type_parts = []
+
+        elif tag == "td" and self.in_tr:
+            # lxml already passes the attributes as a dict
+            label = attrib.get("data-label")
+            if label == "Name":
+                self.in_link_cell = True
+            elif label == "Filing":
+                self.in_filing_cell = True
+
+        elif tag == "a" and self.in_link_cell:
+            self.current_link = attrib.get("href")
+
+    def end(self, tag):
+        if tag == "td":
+            self.in_link_cell = False
+            self.in_filing_cell = False
+
+        elif tag == "tr" and self.in_tr:
+            self.in_tr = False
+            filing_type = "".join(self.filing_type_parts).strip()
+            if self.current_link and filing_type == "PTR Original":
+                link = self.current_link
+                self.links.append(
+                    BASE_URL + link if link.startswith("public_disc/") else link
+                )
+
+            self.current_link = None
+            self.filing_type_parts = []
+
+    def data(self, data):
+        if self.in_filing_cell:
+            self.filing_type_parts.append(data)
+
+    def close(self):
+        return self.links
+
+
+def select_links(html):
+    """
+    Extract the links of 'PTR Original' filings from the search results HTML
+    (bytes) with CSS selectors: every Filing cell is selected at once, and the
+    Name cell's link is only looked up in the rows whose filing type matches.
+    """
+    tree = LexborHTMLParser(html)
+    links = []
+
+    for filing_cell in tree.css('tr > td[data-label="Filing"]'):
+        if filing_cell.text(strip=True) == "PTR Original":
+            a = filing_cell.parent.css_first('td[data-label="Name"] a')
+            link = a.attributes.get("href") if a is not None else None
+            if link:
+                links.append(
+                    BASE_URL + link if link.startswith("public_disc/") else link
+                )
+
+    return links
+
+
+def extract_links(chunks):
+    """
+    Yield the (absolute) links of 'PTR Original' filings from the search results
+    HTML, given as an iterable of bytes chunks (e.g. a streamed response's
+    iter_content()), with selectolax or lxml when either is installed and
+    html.parser otherwise.
+    The latter two parse the chunks as they arrive, so the whole page is never
+    held in memory and parsing overlaps with receiving it. The links found in
+    each chunk are yielded as soon as it's parsed.
+    """
+    if LexborHTMLParser is not None:
+        # NOTE: selectolax can't parse incrementally, so the page is joined first
+        yield from select_links(b"".join(chunks))
+        return
+
+    if etree is not None:
+        # NOTE: The bytes are handed over as is, so decoding happens in C too
+        target = LinkTarget()
+        parser = etree.HTMLParser(target=target)
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from target.links
+            target.links.clear()
+        yield from parser.close()
+        return
+
+    parser = LinkExtractor()
+    # The incremental decoder takes care of characters split across chunks
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+        yield from parser.links
+        parser.links.clear()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    yield from parser.links
+
 
 # class LinkExtractor(HTMLParser):
 #     """HTML parser to extract all <a> tags and their href attributes."""
@@ -87,49 +257,94 @@ class LinkExtractor(HTMLParser):
 #                     self.links.append(value)
 
 
-def get_verification_token():
+_session = None
+_token = None                               # (token, time.monotonic() when it was fetched)
+
+
+def get_session():
     """
-    Fetch the initial page to get a valid __RequestVerificationToken.
+    Return the shared requests.Session, creating it on first use. Reusing it keeps
+    the connection to the site alive between the token fetch and the search (one
+    TLS handshake instead of one per request), and it carries the cookies from the
+    former to the latter.
+    """
+    global _session
+
+    if _session is None:
+        _session = requests.Session()
+        _session.headers.update({
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
+        })
+        # NOTE: The connection pool is sized for search_many's workers once, here,
+        # rather than by each caller
+        _session.mount("https://", requests.adapters.HTTPAdapter(
+            pool_connections=SEARCH_WORKERS, pool_maxsize=SEARCH_WORKERS
+        ))
+
+    return _session
+
+
+def get_verification_token(refresh=False):
+    """
+    Return a valid __RequestVerificationToken, fetching a new one if the last
+    one is older than TOKEN_TTL (or when asked to refresh it).
     This is needed for CSRF protection.
     """
+    global _token
+
+    if not refresh and _token is not None and time.monotonic() - _token[1] < TOKEN_TTL:
+        return _token[0]
+
+    token = fetch_verification_token()
+    # NOTE: Failures aren't cached, so the next search tries again
+    _token = (token, time.monotonic()) if token else None
+    return token
+
+
+def fetch_verification_token():
+    """
+    Fetch the initial page to get a valid __RequestVerificationToken.
+    """
     url = "https://disclosures-clerk.house.gov/FinancialDisclosure"
     headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     }
 
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = get_session().get(url, headers=headers, timeout=30)
         response.raise_for_status()
 
         # Extract token from HTML
-        match = re.search(
-            r'name="__RequestVerificationToken"[^>]*value="([^"]+)"', response.text
-        )
+        # NOTE: The cookies that go along with it are kept by the session
+        match = TOKEN_PATTERN.search(response.content)
         if match:
-            return match.group(1), response.cookies
+            return match.group(1).decode("ascii")
         else:
             print(
                 "Warning: Could not find verification token, proceeding without it",
                 file=sys.stderr,
             )
-            return None, None
+            return None
     except Exception as e:
         print(f"Warning: Could not fetch verification token: {e}", file=sys.stderr)
-        return None, None
+        return None
 
 
-def search_disclosures(last_name=None, filing_year=None, state=None, district=None):
+def search_disclosures(last_name=None, filing_year=None, state=None, district=None, token=None):
     """
     Search House Financial Disclosures with the given parameters.
-    Returns a list of links found in the response.
+    Yields the links found in the response, as it's received and parsed.
+    Raises requests.exceptions.RequestException if the search fails.
+    The cached verification token is used unless one is given, and if the
+    search is rejected (400 or 403), it's retried once with a fresh one.
     """
     url = (
         "https://disclosures-clerk.house.gov/FinancialDisclosure/ViewMemberSearchResult"
     )
 
-    # Get a fresh verification token
-    token, cookies = get_verification_token()
+    # Get a verification token
+    if token is None:
+        token = get_verification_token()
 
     headers = {
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
@@ -143,7 +358,6 @@ def search_disclosures(last_name=None, filing_year=None, state=None, district=No
         "Sec-Fetch-Site": "same-origin",
         "Sec-Fetch-User": "?1",
         "Upgrade-Insecure-Requests": "1",
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
     }
 
     # Build the form data
@@ -154,34 +368,78 @@ def search_disclosures(last_name=None, filing_year=None, state=None, district=No
         "District": district or "",
     }
 
-    # Add verification token if we got one
-    if token:
-        data["__RequestVerificationToken"] = token
+    for attempt in range(2):
+        # Add verification token if we got one
+        if token:
+            data["__RequestVerificationToken"] = token
 
-    try:
-        response = requests.post(
-            url, headers=headers, data=data, cookies=cookies, timeout=30
+        with get_session().post(
+            url, headers=headers, data=data, timeout=30, stream=True
+        ) as response:
+            if attempt == 0 and response.status_code in (400, 403):
+                # The token has most likely expired
+                token = get_verification_token(refresh=True)
+                continue
+
+            response.raise_for_status()
+
+            # Parse the HTML as it's received and extract links
+            # NOTE: They're made absolute as they're extracted
+            yield from extract_links(response.iter_content(STREAM_CHUNK_SIZE))
+            return
+
+
+def search_many(queries, workers=SEARCH_WORKERS):
+    """
+    Run several searches (e.g. one per filing year or state) concurrently.
+    Each query is a dict of search_disclosures' keyword arguments, and a list
+    of link lists is returned in the same order as the queries.
+    The searches are network bound, and the GIL is released while waiting on
+    the sockets, so threads overlap them. They share the session (whose
+    connection pool is sized to SEARCH_WORKERS) and a single verification token.
+    If any search fails, its RequestException is raised here.
+    """
+    token = get_verification_token()
+
+    # NOTE: Each search is consumed into a list on its worker, as it's lazy and
+    # would otherwise only be run when iterated over here
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(
+            executor.map(lambda q: list(search_disclosures(token=token, **q)), queries)
         )
-        response.raise_for_status()
 
-        # Parse the HTML and extract links
-        parser = LinkExtractor()
-        parser.feed(response.text)
-
-        # NOTE: Seems like only relative links are produced.
-        # Make absolute here
-        return [
-            (
-                f"https://disclosures-clerk.house.gov/{l}" 
-                if l.startswith("public_disc/") 
-                else l 
-            )
-            for l in parser.links
-        ]
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error making request: {e}", file=sys.stderr)
-        sys.exit(1)
+def print_search(args):
+    """
+    Run the search for the parsed command line arguments and print its links.
+    """
+    # Check if at least one parameter was provided
+    if not any([args.last_name, args.filing_year, args.state, args.district]):
+        print(
+            "Warning: No search parameters provided, searching all records...",
+            file=sys.stderr,
+        )
+
+    links = search_disclosures(
+        last_name=args.last_name,
+        filing_year=args.filing_year,
+        state=args.state,
+        district=args.district,
+    )
+
+    # The links are printed as they're found, so only they go to stdout (for piping
+    # elsewhere), and the count to stderr once they're all in
+    count = 0
+    for count, link in enumerate(links, 1):
+        print(link)
+    # NOTE: So that a reader of --serve's output gets each search's links as
+    # soon as it's done
+    sys.stdout.flush()
+
+    if count:
+        print(f"\nFound {count} links", file=sys.stderr)
+    else:
+        print("No links found in the response", file=sys.stderr)
 
 
 def main():
@@ -193,6 +451,7 @@ Examples:
   python house_disclosures.py --last-name PELOSI --filing-year 2025
   python house_disclosures.py --last-name SMITH --state CA
   python house_disclosures.py --filing-year 2024
+  printf -- '--filing-year 2024\n--filing-year 2025\n' | python house_disclosures.py --serve
         """,
     )
 
@@ -200,34 +459,36 @@ Examples:
     parser.add_argument("--filing-year", type=str, help="Filing year to search for")
     parser.add_argument("--state", type=str, help="State abbreviation (e.g., CA, NY)")
     parser.add_argument("--district", type=str, help="District number")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Read searches from stdin, one per line (as the flags above), until it's closed",
+    )
 
     args = parser.parse_args()
 
-    # Check if at least one parameter was provided
-    if not any([args.last_name, args.filing_year, args.state, args.district]):
-        print(
-            "Warning: No search parameters provided, searching all records...",
-            file=sys.stderr,
-        )
-
-    links = search_disclosures(
-        last_name=args.last_name,
-        filing_year=args.filing_year,
-        state=args.state,
-        district=args.district,
-    )
-
-    if links:
-        print(f"Found {len(links)} links:\n")
-        for link in links:
-            # Make relative URLs absolute
-            if link.startswith("public_disc/"):
-                full_url = f"https://disclosures-clerk.house.gov/{link}"
-                print(full_url)
-            else:
-                print(link)
-    else:
-        print("No links found in the response")
+    if not args.serve:
+        try:
+            print_search(args)
+        except requests.exceptions.RequestException as e:
+            print(f"Error making request: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    # NOTE: Startup (importing requests, mostly), the connection and the
+    # verification token are paid for once, rather than per search
+    # A bad line or a failed search is reported, and the next line is read
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+
+        try:
+            print_search(parser.parse_args(shlex.split(line)))
+        except SystemExit:
+            # NOTE: argparse has already printed the usage error to stderr
+            continue
+        except (ValueError, requests.exceptions.RequestException) as e:
+            print(f"Error with search '{line.strip()}': {e}", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -1,18 +1,26 @@
 import time
 
 class Timer:
-    def __init__(self, block_name: str):
+    def __init__(self, block_name: str, verbose: bool = True):
         self.block_name = block_name
+        # When False, nothing is printed and the elapsed time is only kept on the
+        # timer (e.g. when timing a block inside a loop)
+        self.verbose = verbose
         self.start_time = 0
+        self.elapsed_time = 0.0
 
     def __enter__(self):
-        self.start_time = time.time()
-        print(f"Starting {self.block_name}")
+        # NOTE: perf_counter_ns is monotonic and has a far finer resolution than
+        # time.time(), and being an integer, there's no precision lost subtracting
+        self.start_time = time.perf_counter_ns()
+        if self.verbose:
+            print(f"Starting {self.block_name}")
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        elapsed_time = time.time() - self.start_time
-        print(f"Finished {self.block_name} in {elapsed_time:.4f} seconds")
+        self.elapsed_time = (time.perf_counter_ns() - self.start_time) / 1e9
+        if self.verbose:
+            print(f"Finished {self.block_name} in {self.elapsed_time:.6f} seconds")
 
         # Returning False (the default behavior) will re-raise any exception
         # that occurred within the 'with' block, which is usually desired.